@@ -1,42 +1,352 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, ForeignKey, DateTime
+from sqlalchemy import create_engine, event, inspect, text, update, Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
-import jwt
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker, relationship
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from fastapi import Request
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from security import hash_password, verify_password, create_access_token, decode_token, InvalidTokenError
 
 load_dotenv()
 
 
 # Konfiguracja bazy danych
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, connect_args={"sslmode": "require"})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 🔹 Silnik tworzymy leniwie – sam import modułu nie łączy się z bazą
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
-# Konfiguracja JWT
-SECRET_KEY = "supersecretkey"  # 🔹 Zmień to na bardziej bezpieczny klucz!
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+_engine = None
+
+
+def _connect_args(url: str) -> dict:
+    """Argumenty połączenia zależne od dialektu (SSL tylko dla Postgresa)."""
+    if url.startswith("postgres"):
+        return {"sslmode": "require"}
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    return {}
+
+
+def get_engine():
+    """Zwraca silnik bazy danych, tworząc go przy pierwszym wywołaniu."""
+    global _engine
+    if _engine is None:
+        url = os.getenv("DATABASE_URL", DATABASE_URL)
+        if not url:
+            raise RuntimeError("Brak zmiennej środowiskowej DATABASE_URL")
+        _engine = create_engine(url, connect_args=_connect_args(url))
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def dispose_engine():
+    """Zamyka pule połączeń (wywoływane przy zamykaniu aplikacji)."""
+    global _engine, _replica_router
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    if _replica_router is not None:
+        _replica_router.dispose()
+        _replica_router = None
+
+
+class ReplicaRouter:
+    """Wybór repliki do odczytu: round-robin albo najmniej aktywnych sesji.
+
+    Replika, do której nie da się połączyć, jest pomijana przez
+    `retry_seconds`. Klient, który właśnie coś zapisał, przez `pin_seconds`
+    czyta z bazy głównej (read-your-writes) – między procesami dzięki czasowi
+    zapisu, który odsyła, a w obrębie procesu także po ID użytkownika.
+    """
+
+    def __init__(self, urls: list[str], strategy: str = "round_robin", pin_seconds: float = 5.0, retry_seconds: float = 30.0):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Nieznana strategia wyboru repliki: {strategy}")
+        self.urls = urls
+        self.strategy = strategy
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._engines = [None] * len(urls)
+        self._active = [0] * len(urls)
+        self._down_until = [0.0] * len(urls)
+        self._round_robin = itertools.count()
+        self._pinned: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def engine(self, index: int):
+        if self._engines[index] is None:
+            url = self.urls[index]
+            self._engines[index] = create_engine(url, connect_args=_connect_args(url), pool_pre_ping=True)
+        return self._engines[index]
+
+    def candidates(self) -> list[int]:
+        """Indeksy dostępnych replik w kolejności, w jakiej należy ich próbować."""
+        now = time.monotonic()
+        healthy = [i for i in range(len(self.urls)) if self._down_until[i] <= now]
+        if not healthy:
+            return []
+        if self.strategy == "least_connections":
+            return sorted(healthy, key=lambda i: self._active[i])
+        start = next(self._round_robin) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def acquire(self, index: int):
+        with self._lock:
+            self._active[index] += 1
+
+    def release(self, index: int):
+        with self._lock:
+            self._active[index] -= 1
+
+    def mark_down(self, index: int):
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def pin(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._pinned) > 10000:
+                self._pinned = {uid: until for uid, until in self._pinned.items() if until > now}
+            self._pinned[user_id] = now + self.pin_seconds
+
+    def is_pinned(self, user_id: int) -> bool:
+        until = self._pinned.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            self._pinned.pop(user_id, None)
+            return False
+        return True
+
+    def recently_written(self, user_id: int | None, last_write: float | None) -> bool:
+        """Czy odczyt musi iść na bazę główną: zapis zgłoszony przez klienta
+        (`last_write`, czas uniksowy) albo przypięcie użytkownika w tym procesie."""
+        if last_write is not None and 0 <= time.time() - last_write < self.pin_seconds:
+            return True
+        return user_id is not None and self.is_pinned(int(user_id))
+
+    def dispose(self):
+        for engine in self._engines:
+            if engine is not None:
+                engine.dispose()
+
+
+_replica_router = None
+
+
+def init_replica_router() -> ReplicaRouter | None:
+    """Buduje router replik z DATABASE_REPLICA_URLS (lista po przecinku); None, gdy replik brak.
+
+    Wywoływane przy starcie aplikacji, więc błędna konfiguracja
+    (DATABASE_REPLICA_STRATEGY, READ_YOUR_WRITES_SECONDS) zatrzymuje start,
+    a nie pierwsze żądanie. Lokalnie wystarczą dwa pliki SQLite, np.
+    DATABASE_REPLICA_URLS=sqlite:///replica1.db,sqlite:///replica2.db
+    """
+    global _replica_router
+    if _replica_router is not None:
+        _replica_router.dispose()
+        _replica_router = None
+    urls = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    if not urls:
+        return None
+    try:
+        pin_seconds = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    except ValueError:
+        raise ValueError("READ_YOUR_WRITES_SECONDS musi być liczbą sekund") from None
+    if pin_seconds < 0:
+        raise ValueError("READ_YOUR_WRITES_SECONDS nie może być ujemne")
+    _replica_router = ReplicaRouter(
+        urls,
+        strategy=os.getenv("DATABASE_REPLICA_STRATEGY", "round_robin"),
+        pin_seconds=pin_seconds,
+    )
+    return _replica_router
+
+
+def get_replica_router() -> ReplicaRouter | None:
+    """Router zbudowany przez `init_replica_router` (None, gdy replik brak lub aplikacja nie wystartowała)."""
+    return _replica_router
 
-# Konfiguracja bcrypt do haszowania haseł
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def init_db():
-    """Tworzy tabele w bazie, jeśli nie istnieją."""
+    """Tworzy tabele (i brakujące indeksy) w bazie, jeśli nie istnieją."""
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    # 🔹 create_all nie dodaje indeksów do istniejących już tabel – tworzymy tylko brakujące
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+    _backfill_users_created_at(engine, inspector)
 
-def get_db():
-    """Tworzy sesję bazy danych i zamyka ją po zakończeniu."""
+# 🔹 Data wpisywana starym kontom bez `created_at` – trafiają na początek listy
+LEGACY_CREATED_AT = datetime(1970, 1, 1)
+
+def _backfill_users_created_at(engine, inspector):
+    """Jednorazowa migracja: uzupełnia puste `users.created_at` (stronicowanie keyset
+    wymaga wartości) i dodaje NOT NULL. Gdy kolumna ma już NOT NULL – nic nie robi."""
+    columns = {column["name"]: column for column in inspector.get_columns("users")}
+    if not columns["created_at"]["nullable"]:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(
+            update(User.__table__).where(User.created_at.is_(None)).values(created_at=LEGACY_CREATED_AT)
+        )
+        # 🔹 SQLite nie obsługuje ALTER COLUMN; nowe tabele i tak mają NOT NULL z modelu
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE users ALTER COLUMN created_at SET NOT NULL"))
+
+# 🔹 Ile wierszy pobieramy naraz z kursora przy eksportach strumieniowych
+STREAM_BATCH_SIZE = 1000
+
+@contextmanager
+def primary_session():
+    """Sesja na bazie głównej poza zależnościami FastAPI – np. w generatorze
+    odpowiedzi strumieniowej, bo `get_db` zamyka się przed końcem strumienia."""
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+def get_db():
+    """Tworzy sesję bazy danych i zamyka ją po zakończeniu."""
+    with primary_session() as db:
+        yield db
+
+class ReplicaSession(Session):
+    """Sesja na replice. Gdy zapytanie na replice się nie powiedzie (np. brak
+    połączenia albo schematu), replika jest oznaczana jako niedostępna,
+    a to samo zapytanie jest ponawiane na bazie głównej."""
+
+    def execute(self, *args, **kwargs):
+        index = self.info.get("replica")
+        if index is None:
+            return super().execute(*args, **kwargs)
+        try:
+            return super().execute(*args, **kwargs)
+        except DBAPIError:
+            router = get_replica_router()
+            if router is not None:
+                router.mark_down(index)
+            self.rollback()
+            self.info["replica"] = None
+            self.bind = get_engine()
+            return super().execute(*args, **kwargs)
+
+
+ReplicaSessionLocal = sessionmaker(class_=ReplicaSession, autoflush=False)
+
+
+# 🔹 Read-your-writes między procesami: chwilę zapisu oddajemy klientowi (ciasteczko
+# i nagłówek), a klient odsyła ją przy kolejnych żądaniach.
+LAST_WRITE_COOKIE = "db_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+_request_writes: ContextVar[dict | None] = ContextVar("request_writes", default=None)
+
+
+def track_request_writes() -> dict:
+    """Zaczyna śledzenie zapisów bieżącego żądania (wywoływane przez middleware).
+
+    Zwracany słownik jest współdzielony z wątkami endpointów synchronicznych,
+    więc po żądaniu `writes.get("at")` zawiera czas ostatniego zapisu.
+    """
+    writes = {}
+    _request_writes.set(writes)
+    return writes
+
+
+def mark_request_write(user_id: int | None = None):
+    """Oznacza, że bieżące żądanie zapisało dane – kolejne odczyty idą na bazę główną."""
+    writes = _request_writes.get()
+    if writes is not None:
+        writes["at"] = time.time()
+    router = get_replica_router()
+    if router is not None and user_id is not None:
+        router.pin(user_id)
+
+
+def parse_last_write(value: str | None) -> float | None:
+    """Czas ostatniego zapisu odesłany przez klienta (ciasteczko lub nagłówek)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def read_session(user_id: int | None = None, last_write: float | None = None):
+    """Sesja tylko do odczytu – z repliki, a gdy replik brak, są niedostępne
+    lub klient/użytkownik niedawno zapisywał – z bazy głównej."""
+    router = get_replica_router()
+    if router is None or router.recently_written(user_id, last_write):
+        yield from get_db()
+        return
+
+    for index in router.candidates():
+        db = ReplicaSessionLocal(bind=router.engine(index), info={"replica": index})
+        try:
+            db.connection()  # 🔹 pool_pre_ping sprawdza połączenie przed użyciem
+        except DBAPIError:
+            db.close()
+            router.mark_down(index)
+            continue
+
+        router.acquire(index)
+        try:
+            yield db
+        except OperationalError:
+            # 🔹 Po przełączeniu na bazę główną błąd nie dotyczy już repliki
+            if db.info.get("replica") is not None:
+                router.mark_down(index)
+            raise
+        finally:
+            router.release(index)
+            db.close()
+        return
+
+    yield from get_db()
+
+def get_read_db(request: Request):
+    """Zależność FastAPI: sesja do odczytu dla endpointów bez zalogowanego użytkownika."""
+    yield from read_session(last_write=request_last_write(request))
+
+def request_last_write(request: Request) -> float | None:
+    return parse_last_write(request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE))
+
+
+# 🔹 Śledzenie zapisów: po commicie z zapisem przypinamy żądanie (i użytkownika) do bazy głównej.
+# `user_id` w `session.info` ustawia `get_current_user`.
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_writer(session):
+    if session.info.pop("wrote", False):
+        mark_request_write(session.info.get("user_id"))
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -45,7 +355,15 @@ class User(Base):
     username = Column(String, unique=True, nullable=False) 
     email = Column(String, unique=True, nullable=False) 
     password = Column(String, nullable=False)  # ✅ Hasło będzie przechowywane w postaci hashowanej
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # 🔹 Indeks pod stronicowanie keyset w panelu admina
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # 🔹 Indeksy pod filtry po prefiksie (LIKE 'abc%'); w Postgresie wymagają text_pattern_ops
+        Index("ix_users_username_prefix", "username", postgresql_ops={"username": "text_pattern_ops"}),
+        Index("ix_users_email_prefix", "email", postgresql_ops={"email": "text_pattern_ops"}),
+    )
 
     # Relacje
     questions = relationship("Question", back_populates="user", cascade="all, delete-orphan")
@@ -54,28 +372,24 @@ class User(Base):
     # Metody dla haseł i tokenów
     def set_password(self, password: str):
         """Haszuje hasło użytkownika"""
-        self.password = pwd_context.hash(password)  # ✅ Poprawione przechowywanie hasha
+        self.password = hash_password(password)  # ✅ Poprawione przechowywanie hasha
 
     def verify_password(self, password: str):
         """Sprawdza czy podane hasło jest poprawne"""
-        return pwd_context.verify(password, self.password)  # ✅ Poprawione porównywanie hasła
+        return verify_password(password, self.password)  # ✅ Poprawione porównywanie hasła
 
     def get_jwt_token(self):
         """Generuje token JWT dla użytkownika"""
-        expiration = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        payload = {"sub": self.id, "exp": expiration}  # 🔹 ID zamiast username
-        return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+        return create_access_token({"sub": str(self.id)})  # 🔹 ID zamiast username
 
     @staticmethod
     def decode_jwt_token(token: str):
         """Dekoduje token JWT i zwraca ID użytkownika"""
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = decode_token(token)
             return payload.get("sub")  # ✅ Poprawione zwracanie ID użytkownika
-        except jwt.ExpiredSignatureError:
-            return None  # Token wygasł
-        except jwt.PyJWTError:
-            return None  # Token nieprawidłowy
+        except InvalidTokenError:
+            return None  # Token nieprawidłowy lub wygasł
 
 class Question(Base):
     __tablename__ = "questions"
@@ -84,6 +398,9 @@ class Question(Base):
     dataset_name = Column(String, nullable=False)  
     question_text = Column(Text, nullable=False)
 
+    # 🔹 Wyszukiwanie bazy pytań właściciela po nazwie
+    __table_args__ = (Index("ix_questions_user_dataset", "user_id", "dataset_name"),)
+
     user = relationship("User", back_populates="questions")
     answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan")
 
@@ -96,6 +413,30 @@ class Answer(Base):
 
     question = relationship("Question", back_populates="answers")
 
+class DatasetShare(Base):
+    """Kod udostępniania bazy pytań (jeden na bazę właściciela)."""
+    __tablename__ = "dataset_shares"
+    __table_args__ = (UniqueConstraint("owner_id", "dataset_name", name="uq_dataset_shares_owner_dataset"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    dataset_name = Column(String, nullable=False)
+    code = Column(String, unique=True, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DatasetMember(Base):
+    """Dostęp (tylko do odczytu) użytkownika do cudzej bazy pytań – bez kopiowania pytań."""
+    __tablename__ = "dataset_members"
+    # 🔹 Nazwa bazy jest unikalna w obrębie użytkownika (własne + udostępnione)
+    __table_args__ = (UniqueConstraint("user_id", "dataset_name", name="uq_dataset_members_user_dataset"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    share_id = Column(Integer, ForeignKey("dataset_shares.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    dataset_name = Column(String, nullable=False)
+    joined_at = Column(DateTime, default=datetime.utcnow)
+
 class QuizSession(Base):
     __tablename__ = "quiz_sessions"
     id = Column(Integer, primary_key=True, index=True)
@@ -118,10 +459,18 @@ class UserScore(Base):
 
     user = relationship("User", back_populates="scores")
 
-class UsedResetToken(Base):
-    __tablename__ = "used_reset_tokens"
+class RevokedToken(Base):
+    """Unieważnione tokeny (reset hasła, wylogowanie) – trzymamy tylko `jti` i datę wygaśnięcia."""
+    __tablename__ = "revoked_tokens"
 
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, nullable=False)
-    used_at = Column(DateTime, default=datetime.utcnow)
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # 🔹 pod sprzątanie wygasłych
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class TokenCutoff(Base):
+    """„Unieważnij wszystko sprzed chwili X” dla użytkownika (bez FK – ma przetrwać usunięcie konta)."""
+    __tablename__ = "token_cutoffs"
 
+    user_id = Column(Integer, primary_key=True)
+    revoked_before = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -0,0 +1,33 @@
+from sqlalchemy.orm import Session
+from database import Question, DatasetMember
+
+
+def owns_dataset(db: Session, user_id: int, dataset_name: str) -> bool:
+    """Czy użytkownik jest właścicielem bazy pytań o tej nazwie."""
+    return db.query(Question.id).filter(
+        Question.user_id == user_id,
+        Question.dataset_name == dataset_name
+    ).first() is not None
+
+
+def resolve_dataset_owner(db: Session, user_id: int, dataset_name: str) -> int | None:
+    """Zwraca ID właściciela bazy widocznej dla użytkownika pod tą nazwą (własna albo udostępniona)."""
+    if owns_dataset(db, user_id, dataset_name):
+        return user_id
+
+    membership = db.query(DatasetMember.owner_id).filter(
+        DatasetMember.user_id == user_id,
+        DatasetMember.dataset_name == dataset_name
+    ).first()
+    return membership[0] if membership else None
+
+
+def can_access_question(db: Session, user_id: int, question: Question) -> bool:
+    """Czy użytkownik ma dostęp do pytania (jest właścicielem albo członkiem jego bazy)."""
+    if question.user_id == user_id:
+        return True
+    return db.query(DatasetMember.id).filter(
+        DatasetMember.user_id == user_id,
+        DatasetMember.owner_id == question.user_id,
+        DatasetMember.dataset_name == question.dataset_name
+    ).first() is not None
@@ -0,0 +1,218 @@
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from database import get_db, primary_session, STREAM_BATCH_SIZE, User, Question, Answer
+from dataset_access import resolve_dataset_owner
+from users import get_current_user
+import gzip
+import json
+import zlib
+from urllib.parse import quote
+
+router = APIRouter()
+
+# 🔹 Format wymiany baz pytań: gzip + JSONL.
+# Pierwsza linia to nagłówek {"format": ..., "version": ..., "dataset_name": ...},
+# każda kolejna to jedno pytanie {"q": treść, "a": [odpowiedzi], "k": maska bitowa poprawnych}.
+EXPORT_FORMAT = "webownik-dataset"
+EXPORT_VERSION = 1
+IMPORT_BATCH_SIZE = 500
+
+
+def pack_answer_key(flags) -> int:
+    """[True, False, True] → 0b101 (bit i = odpowiedź i jest poprawna)."""
+    mask = 0
+    for i, correct in enumerate(flags):
+        if correct:
+            mask |= 1 << i
+    return mask
+
+
+def unpack_answer_key(mask: int, count: int) -> list[bool]:
+    return [bool(mask >> i & 1) for i in range(count)]
+
+
+# 🔹 Błędy uszkodzonego pliku: zły gzip, ucięty plik, zły JSON/UTF-8
+READ_ERRORS = (OSError, EOFError, zlib.error, ValueError)
+
+
+def _is_valid_record(item) -> bool:
+    """Rekord pytania: {"q": str, "a": [str, ...], "k": int >= 0}."""
+    if not isinstance(item, dict) or not isinstance(item.get("q"), str):
+        return False
+    answers = item.get("a")
+    if not isinstance(answers, list) or not all(isinstance(a, str) for a in answers):
+        return False
+    key = item.get("k", 0)
+    return isinstance(key, int) and not isinstance(key, bool) and key >= 0
+
+
+@router.get("/export/{dataset_name}")
+def export_dataset(dataset_name: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """📤 Strumieniowy eksport bazy pytań do pliku .jsonl.gz (stała pamięć)."""
+    owner_id = resolve_dataset_owner(db, current_user.id, dataset_name)
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Zestaw pytań nie istnieje.")
+
+    stmt = (
+        select(Question.id, Question.question_text, Answer.answer_text, Answer.is_correct)
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .where(Question.user_id == owner_id, Question.dataset_name == dataset_name)
+        .order_by(Question.id, Answer.id)
+    )
+
+    def lines():
+        yield json.dumps({"format": EXPORT_FORMAT, "version": EXPORT_VERSION, "dataset_name": dataset_name}) + "\n"
+
+        # 🔹 Własna sesja – zależność `get_db` zamyka się przed końcem strumienia
+        with primary_session() as session:
+            current_id, text, answers, flags = None, None, [], []
+            for question_id, question_text, answer_text, is_correct in session.execute(
+                stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+            ):
+                if question_id != current_id:
+                    if current_id is not None:
+                        yield json.dumps({"q": text, "a": answers, "k": pack_answer_key(flags)}, ensure_ascii=False) + "\n"
+                    current_id, text, answers, flags = question_id, question_text, [], []
+                if answer_text is not None:
+                    answers.append(answer_text)
+                    flags.append(is_correct)
+            if current_id is not None:
+                yield json.dumps({"q": text, "a": answers, "k": pack_answer_key(flags)}, ensure_ascii=False) + "\n"
+
+    def compressed():
+        compressor = zlib.compressobj(wbits=31)  # 🔹 wbits=31 → nagłówek gzip
+        for line in lines():
+            chunk = compressor.compress(line.encode("utf-8"))
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    return StreamingResponse(
+        compressed(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(dataset_name)}.jsonl.gz"},
+    )
+
+
+@router.post("/import/")
+def import_dataset(
+    file: UploadFile = File(...),
+    dataset_name: str | None = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """📥 Import bazy pytań z pliku .jsonl.gz – czytany strumieniowo, zapisywany partiami."""
+    stream = gzip.open(file.file, "rt", encoding="utf-8")
+    try:
+        header = json.loads(stream.readline())
+    except READ_ERRORS:
+        raise HTTPException(status_code=400, detail="❌ Plik nie jest poprawnym eksportem bazy pytań!")
+
+    if not isinstance(header, dict) or header.get("format") != EXPORT_FORMAT or header.get("version") != EXPORT_VERSION:
+        raise HTTPException(status_code=400, detail="❌ Nieobsługiwany format lub wersja pliku!")
+
+    dataset_name = dataset_name or header.get("dataset_name")
+    if not dataset_name or not isinstance(dataset_name, str):
+        raise HTTPException(status_code=400, detail="❌ Brak nazwy bazy pytań!")
+    if resolve_dataset_owner(db, current_user.id, dataset_name) is not None:
+        raise HTTPException(status_code=400, detail=f"❌ Baza pytań '{dataset_name}' już istnieje!")
+
+    user_id = current_user.id
+    count = 0
+    batch = []
+
+    def flush_batch():
+        questions = [Question(user_id=user_id, dataset_name=dataset_name, question_text=q["q"]) for q in batch]
+        db.add_all(questions)
+        db.flush()  # ✅ nadaje `id` pytaniom
+        for question, item in zip(questions, batch):
+            flags = unpack_answer_key(item.get("k", 0), len(item["a"]))
+            db.add_all(
+                Answer(question_id=question.id, answer_text=text, is_correct=correct)
+                for text, correct in zip(item["a"], flags)
+            )
+        db.flush()
+        db.expunge_all()  # 🔹 nie trzymamy w pamięci obiektów z poprzednich partii
+        batch.clear()
+
+    try:
+        for line in stream:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not _is_valid_record(item):
+                raise ValueError("niepoprawny rekord")
+            batch.append(item)
+            count += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush_batch()
+        if batch:
+            flush_batch()
+    except READ_ERRORS + (SQLAlchemyError,):
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"❌ Błąd w linii {count + 2} pliku!")
+
+    if count == 0:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="❌ Plik nie zawiera pytań!")
+
+    db.commit()
+    return {"message": f"✅ Zaimportowano bazę '{dataset_name}'.", "count": count}
+
+
+@router.post("/clone/{dataset_name}")
+def clone_dataset(
+    dataset_name: str,
+    new_name: str = Form(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """📋 Kopiuje bazę (własną lub udostępnioną) do nowej bazy użytkownika – w całości po stronie serwera."""
+    # 🔒 Blokada wiersza użytkownika (do końca transakcji) szereguje jego klonowania –
+    # dwa równoległe żądania nie utworzą tej samej bazy ani nie przeplotą swoich pytań
+    db.query(User.id).filter(User.id == current_user.id).with_for_update().one()
+
+    owner_id = resolve_dataset_owner(db, current_user.id, dataset_name)
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Zestaw pytań nie istnieje.")
+    if resolve_dataset_owner(db, current_user.id, new_name) is not None:
+        raise HTTPException(status_code=400, detail=f"❌ Baza pytań '{new_name}' już istnieje!")
+
+    # 🔹 INSERT ... SELECT pytań w kolejności `id`, więc nowe `id` rosną w tej samej kolejności
+    copied = db.execute(
+        insert(Question).from_select(
+            ["user_id", "dataset_name", "question_text"],
+            select(literal(current_user.id), literal(new_name), Question.question_text)
+            .where(Question.user_id == owner_id, Question.dataset_name == dataset_name)
+            .order_by(Question.id),
+        )
+    ).rowcount
+
+    # 🔹 Odpowiedzi łączymy ze starymi/nowymi pytaniami po numerze porządkowym.
+    # Założenie: autoinkrementowane `id` są nadawane w kolejności wierszy z SELECT-a
+    # (tak działa SERIAL/IDENTITY w Postgresie i ROWID w SQLite), a nowa baza przed
+    # INSERT-em była pusta i nikt inny do niej nie pisze – gwarantuje to blokada wyżej.
+    def numbered(user_id: int, name: str):
+        return (
+            select(Question.id, func.row_number().over(order_by=Question.id).label("rn"))
+            .where(Question.user_id == user_id, Question.dataset_name == name)
+            .subquery()
+        )
+
+    old_q = numbered(owner_id, dataset_name)
+    new_q = numbered(current_user.id, new_name)
+    db.execute(
+        insert(Answer).from_select(
+            ["question_id", "answer_text", "is_correct"],
+            select(new_q.c.id, Answer.answer_text, Answer.is_correct)
+            .join(old_q, Answer.question_id == old_q.c.id)
+            .join(new_q, old_q.c.rn == new_q.c.rn)
+            .order_by(Answer.id),
+        )
+    )
+    db.commit()
+
+    return {"message": f"✅ Skopiowano bazę '{dataset_name}' jako '{new_name}'.", "count": copied}
@@ -1,10 +1,11 @@
 import os
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def send_reset_email(to_email: str, reset_token: str):
+    import requests  # 🔹 ładowane leniwie – niepotrzebne przy starcie aplikacji
+
     reset_url = f"{os.getenv('RESET_LINK_BASE_URL')}?token={reset_token}"
 
     response = requests.post(
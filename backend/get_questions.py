@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db, Question, User
-from users import get_current_user
+from database import get_db, Question, User, DatasetShare, DatasetMember
+from dataset_access import owns_dataset, resolve_dataset_owner
+from users import get_current_user, get_current_user_read, get_user_read_db
+import secrets
 
 router = APIRouter()
 
 @router.get("/datasets/")
 def get_datasets(
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_user_read_db), 
+    current_user: User = Depends(get_current_user_read)
 ):
-    """✅ Zwraca listę baz pytań przypisanych do zalogowanego użytkownika."""
+    """✅ Zwraca listę baz pytań użytkownika – własnych i udostępnionych mu przez innych."""
 
     datasets = db.query(Question.dataset_name).filter(
         Question.user_id == current_user.id
@@ -18,20 +21,28 @@ def get_datasets(
 
     dataset_list = [d[0] for d in datasets] if datasets else []
 
-    return {"datasets": dataset_list}
+    shared = db.query(DatasetMember.dataset_name, User.username).join(
+        User, User.id == DatasetMember.owner_id
+    ).filter(DatasetMember.user_id == current_user.id).all()
+
+    return {
+        "datasets": dataset_list + [name for name, _ in shared],
+        "shared": [{"dataset_name": name, "owner": owner} for name, owner in shared],
+    }
 
 @router.get("/questions/{dataset_name}")
 def get_questions(
     dataset_name: str, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_user_read_db), 
+    current_user: User = Depends(get_current_user_read)
 ):
-    """✅ Zwraca wszystkie pytania z wybranej bazy pytań użytkownika."""
+    """✅ Zwraca wszystkie pytania z wybranej bazy pytań użytkownika (także udostępnionej)."""
 
+    owner_id = resolve_dataset_owner(db, current_user.id, dataset_name)
     questions = db.query(Question).filter(
-        Question.user_id == current_user.id,
+        Question.user_id == owner_id,
         Question.dataset_name == dataset_name
-    ).all()
+    ).all() if owner_id is not None else []
 
     if not questions:
         raise HTTPException(status_code=404, detail=f"❌ Brak pytań w bazie '{dataset_name}'!")
@@ -54,16 +65,112 @@ def get_questions(
 @router.delete("/datasets/{dataset_name}")
 def delete_dataset(dataset_name: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """
-    ✅ Usuwa cały zestaw pytań z bazy danych
+    ✅ Usuwa cały zestaw pytań z bazy danych (dla bazy udostępnionej – tylko rezygnuje z dostępu)
     """
-    questions = db.query(Question).filter(Question.dataset_name == dataset_name).all()
+    if not owns_dataset(db, current_user.id, dataset_name):
+        membership = db.query(DatasetMember).filter(
+            DatasetMember.user_id == current_user.id,
+            DatasetMember.dataset_name == dataset_name
+        ).first()
+        if not membership:
+            raise HTTPException(status_code=404, detail="Zestaw pytań nie istnieje.")
 
-    if not questions:
-        raise HTTPException(status_code=404, detail="Zestaw pytań nie istnieje.")
+        db.delete(membership)
+        db.commit()
+        return {"message": f"Zrezygnowano z dostępu do zestawu '{dataset_name}'."}
+
+    questions = db.query(Question).filter(
+        Question.user_id == current_user.id,
+        Question.dataset_name == dataset_name
+    ).all()
 
     for question in questions:
         db.delete(question)
 
+    _delete_share(db, current_user.id, dataset_name)
     db.commit()
 
     return {"message": f"Zestaw pytań '{dataset_name}' został usunięty."}
+
+
+def _delete_share(db: Session, owner_id: int, dataset_name: str) -> bool:
+    """Usuwa kod udostępniania bazy razem z dostępami odbiorców (bez commita)."""
+    share = db.query(DatasetShare).filter(
+        DatasetShare.owner_id == owner_id,
+        DatasetShare.dataset_name == dataset_name
+    ).first()
+    if not share:
+        return False
+
+    db.query(DatasetMember).filter(DatasetMember.share_id == share.id).delete(synchronize_session=False)
+    db.delete(share)
+    return True
+
+
+@router.post("/share/{dataset_name}")
+def share_dataset(dataset_name: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """🔗 Zwraca (w razie potrzeby tworzy) kod, którym można udostępnić bazę innym użytkownikom."""
+    if not owns_dataset(db, current_user.id, dataset_name):
+        raise HTTPException(status_code=404, detail="Zestaw pytań nie istnieje.")
+
+    def find_share():
+        return db.query(DatasetShare).filter(
+            DatasetShare.owner_id == current_user.id,
+            DatasetShare.dataset_name == dataset_name
+        ).first()
+
+    share = find_share()
+    while not share:
+        new_share = DatasetShare(owner_id=current_user.id, dataset_name=dataset_name, code=secrets.token_urlsafe(8))
+        db.add(new_share)
+        try:
+            db.commit()
+        except IntegrityError:
+            # 🔹 Równoległe żądanie utworzyło kod pierwsze (albo kolizja kodu – wtedy losujemy nowy)
+            db.rollback()
+            share = find_share()
+            continue
+        db.refresh(new_share)
+        share = new_share
+
+    members = db.query(DatasetMember).filter(DatasetMember.share_id == share.id).count()
+    return {"dataset_name": dataset_name, "code": share.code, "members": members}
+
+
+@router.delete("/share/{dataset_name}")
+def unshare_dataset(dataset_name: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """🔒 Unieważnia kod udostępniania i odbiera dostęp wszystkim odbiorcom."""
+    if not _delete_share(db, current_user.id, dataset_name):
+        raise HTTPException(status_code=404, detail="Ten zestaw nie jest udostępniony.")
+
+    db.commit()
+    return {"message": f"Zestaw '{dataset_name}' nie jest już udostępniany."}
+
+
+@router.post("/join/{code}")
+def join_dataset(code: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """✅ Dołącza do udostępnionej bazy pytań (dostęp tylko do odczytu, bez kopiowania pytań)."""
+    share = db.query(DatasetShare).filter(DatasetShare.code == code).first()
+    if not share:
+        raise HTTPException(status_code=404, detail="Nieprawidłowy kod udostępniania.")
+
+    if share.owner_id == current_user.id:
+        raise HTTPException(status_code=400, detail="To jest Twój własny zestaw pytań.")
+
+    if resolve_dataset_owner(db, current_user.id, share.dataset_name) is not None:
+        raise HTTPException(status_code=400, detail=f"Masz już bazę pytań '{share.dataset_name}'!")
+
+    db.add(DatasetMember(
+        user_id=current_user.id,
+        share_id=share.id,
+        owner_id=share.owner_id,
+        dataset_name=share.dataset_name
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # 🔹 Równoległe dołączenie (albo nowa baza o tej nazwie) wygrało wyścig
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Masz już bazę pytań '{share.dataset_name}'!")
+
+    return {"message": f"✅ Dodano udostępnioną bazę '{share.dataset_name}'.", "dataset_name": share.dataset_name}
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from database import get_db, User, Question, Answer
 from users import get_current_user
+from dataset_access import resolve_dataset_owner
 
 router = APIRouter()
 
@@ -18,13 +19,8 @@ async def upload_folder(
     if not files:
         raise HTTPException(status_code=400, detail="❌ Nie przesłano żadnych plików!")
 
-    # 🔹 Sprawdzamy, czy użytkownik ma już bazę o tej nazwie
-    existing_dataset = db.query(Question).filter(
-        Question.user_id == current_user.id,
-        Question.dataset_name == dataset_name
-    ).first()
-
-    if existing_dataset:
+    # 🔹 Sprawdzamy, czy użytkownik ma już bazę o tej nazwie (własną lub udostępnioną)
+    if resolve_dataset_owner(db, current_user.id, dataset_name) is not None:
         raise HTTPException(status_code=400, detail=f"❌ Baza pytań '{dataset_name}' już istnieje!")
 
     files_processed = 0
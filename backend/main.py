@@ -1,34 +1,96 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+from fastapi import FastAPI, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from database import init_db
+from database import init_db, init_replica_router, dispose_engine, get_replica_router, track_request_writes, LAST_WRITE_COOKIE, LAST_WRITE_HEADER
 from load_questions import router as questions_router
 from get_questions import router as get_questions_router
+from dataset_transfer import router as dataset_transfer_router
 from quiz import router as quiz_router
 from users import router as users_router
 from score import router as score_router
+from revocation import revocation_store
 
 
-app = FastAPI()
-
-# 🔹 Konfiguracja CORS (umożliwia dostęp do API z innych domen, np. frontend React)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # 🔹 Tu można podać konkretne adresy np. ["http://localhost:3000"]
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # 🔹 OAuth2 dla Swagger UI (teraz poprawnie działa z JWT)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# 🔹 Rejestracja routerów
-app.include_router(users_router, prefix="/users")
-app.include_router(questions_router, prefix="/questions")
-app.include_router(get_questions_router, prefix="/datasets")
-app.include_router(quiz_router, prefix="/quiz")
-app.include_router(score_router)
 
-# 🔹 Inicjalizacja bazy danych (na końcu, aby uniknąć problemów z importami)
-init_db()
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+async def _compact_revocations_periodically():
+    """Co `compact_seconds` usuwa wygasłe unieważnienia tokenów (poza ścieżką żądań)."""
+    while True:
+        await asyncio.sleep(revocation_store.compact_seconds)
+        try:
+            await run_in_threadpool(revocation_store.compact)
+        except Exception:
+            logging.getLogger(__name__).exception("Nie udało się wyczyścić unieważnionych tokenów")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start i zamknięcie aplikacji – baza jest dotykana dopiero tutaj, nie przy imporcie."""
+    init_replica_router()  # ❌ błędna konfiguracja replik przerywa start
+    if app.state.init_db:
+        init_db()
+    compaction = asyncio.create_task(_compact_revocations_periodically())
+    yield
+    compaction.cancel()
+    dispose_engine()
+
+
+def create_app(init_database: bool | None = None) -> FastAPI:
+    """✅ Fabryka aplikacji.
+
+    `init_database` decyduje, czy przy starcie wykonać `create_all`
+    (domyślnie zmienna środowiskowa INIT_DB, a gdy jej brak – tak).
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.state.init_db = _env_flag("INIT_DB", True) if init_database is None else init_database
+
+    # 🔹 Konfiguracja CORS (umożliwia dostęp do API z innych domen, np. frontend React)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # 🔹 Tu można podać konkretne adresy np. ["http://localhost:3000"]
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[LAST_WRITE_HEADER],
+    )
+
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        """Po żądaniu z zapisem oddaje klientowi jego czas (ciasteczko + nagłówek),
+        żeby kolejne odczyty – w dowolnym procesie – szły na bazę główną."""
+        writes = track_request_writes()
+        response = await call_next(request)
+        router = get_replica_router()
+        if writes.get("at") and router is not None:
+            value = repr(writes["at"])
+            response.headers[LAST_WRITE_HEADER] = value
+            response.set_cookie(LAST_WRITE_COOKIE, value, max_age=max(1, int(router.pin_seconds) + 1), httponly=True, samesite="lax")
+        return response
+
+    # 🔹 Rejestracja routerów
+    app.include_router(users_router, prefix="/users")
+    app.include_router(questions_router, prefix="/questions")
+    app.include_router(get_questions_router, prefix="/datasets")
+    app.include_router(dataset_transfer_router, prefix="/datasets")
+    app.include_router(quiz_router, prefix="/quiz")
+    app.include_router(score_router)
+
+    return app
+
+
+# 🔹 Zachowujemy `main:app` dla `uvicorn main:app`
+app = create_app()
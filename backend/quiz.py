@@ -1,19 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from database import get_db, Question, QuizSession, Answer, UserScore, User
-from users import get_current_user
+from database import get_db, get_read_db, primary_session, Question, QuizSession, Answer, UserScore, User
+from users import get_current_user, get_current_user_read, get_user_read_db
+from dataset_access import resolve_dataset_owner, can_access_question
 from typing import List
 import random
 
 router = APIRouter()
 
+LOST_ACCESS_DETAIL = "Brak dostępu do tego pytania! Quiz został zakończony."
+
+
+def _end_quiz_session(db: Session, user_id: int):
+    """Usuwa całą kolejkę quizu użytkownika (np. po odebraniu dostępu do bazy)."""
+    db.query(QuizSession).filter(QuizSession.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def _end_quiz_session_on_primary(user_id: int):
+    """Jak `_end_quiz_session`, ale zawsze na bazie głównej – dla endpointów czytających z repliki."""
+    with primary_session() as db:
+        db.info["user_id"] = user_id  # 🔹 kolejne odczyty użytkownika trafią na bazę główną
+        _end_quiz_session(db, user_id)
+
 @router.post("/quiz/")
 def start_quiz(dataset_name: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """✅ Tworzy nową sesję quizu dla zalogowanego użytkownika."""
 
+    owner_id = resolve_dataset_owner(db, current_user.id, dataset_name)
     questions = db.query(Question).filter(
-        Question.user_id == current_user.id, Question.dataset_name == dataset_name
-    ).all()
+        Question.user_id == owner_id, Question.dataset_name == dataset_name
+    ).all() if owner_id is not None else []
     if not questions:
         raise HTTPException(status_code=404, detail="Brak pytań w tej bazie!")
 
@@ -40,7 +57,7 @@ def reset_quiz(db: Session = Depends(get_db), current_user: User = Depends(get_c
     return {"message": "✅ Sesja quizu została zresetowana!"}
 
 @router.get("/quiz/next/")
-def get_next_question(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_next_question(db: Session = Depends(get_user_read_db), current_user: User = Depends(get_current_user_read)):
     """✅ Zwraca kolejne pytanie użytkownika zgodnie z kolejnością w bazie."""
     session_entry = (
         db.query(QuizSession)
@@ -53,6 +70,11 @@ def get_next_question(db: Session = Depends(get_db), current_user: User = Depend
         return {"message": "✅ Quiz zakończony!", "finished": True}
 
     question = db.query(Question).filter(Question.id == session_entry.question_id).first()
+    # 🔹 Pytanie usunięte albo dostęp odebrany – kończymy quiz, żeby nie utknął na tym pytaniu
+    if not question or not can_access_question(db, current_user.id, question):
+        _end_quiz_session_on_primary(current_user.id)
+        raise HTTPException(status_code=403, detail=LOST_ACCESS_DETAIL)
+
     answers = db.query(Answer).filter(Answer.question_id == question.id).all()
     return {
         "id": question.id,
@@ -63,7 +85,7 @@ def get_next_question(db: Session = Depends(get_db), current_user: User = Depend
     }
 
 @router.get("/quiz/status/")
-def get_quiz_status(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_quiz_status(db: Session = Depends(get_user_read_db), current_user: User = Depends(get_current_user_read)):
     """✅ Zwraca liczbę pozostałych pytań w quizie oraz aktywną bazę."""
     remaining_questions = db.query(QuizSession).filter(QuizSession.user_id == current_user.id).count()
     
@@ -104,6 +126,12 @@ def submit_answer(
     if not session_entry:
         raise HTTPException(status_code=404, detail="Pytanie nie znajduje się w quizie!")
 
+    # 🔹 Dostęp do pytania mógł zostać odebrany w trakcie quizu (np. cofnięte udostępnienie)
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question or not can_access_question(db, current_user.id, question):
+        _end_quiz_session(db, current_user.id)
+        raise HTTPException(status_code=403, detail=LOST_ACCESS_DETAIL)
+
     # Pobieramy poprawne odpowiedzi dla pytania
     correct_answers = db.query(Answer).filter(
         Answer.question_id == question_id, Answer.is_correct == True
@@ -214,7 +242,7 @@ def debug_quiz(db: Session = Depends(get_db), current_user: User = Depends(get_c
     return {"quiz_queue": queue}
 
 @router.get("/ranking/")
-def get_ranking(db: Session = Depends(get_db)):
+def get_ranking(db: Session = Depends(get_read_db)):
     """✅ Zwraca ranking użytkowników według punktów."""
     top_users = db.query(UserScore).order_by(UserScore.score.desc()).limit(10).all()
     
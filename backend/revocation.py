@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import RevokedToken, TokenCutoff, primary_session
+from security import ACCESS_TOKEN_EXPIRE_MINUTES
+
+
+def token_id(payload: dict, token: str | None = None) -> str | None:
+    """Zwraca `jti` tokena; dla starszych tokenów bez `jti` – skrót SHA-256 z całego tokena."""
+    jti = payload.get("jti")
+    if jti:
+        return jti
+    if token:
+        return hashlib.sha256(token.encode()).hexdigest()[:32]
+    return None
+
+
+def _from_timestamp(value) -> datetime | None:
+    if value is None:
+        return None
+    return datetime.utcfromtimestamp(float(value))
+
+
+class RevocationStore:
+    """Rejestr unieważnionych tokenów z pamięciowym cache przed tabelą.
+
+    Sprawdzenie w `get_current_user` to wyszukanie w słowniku. Co
+    `refresh_seconds` cache jest uzupełniany wszystkimi niewygasłymi wpisami
+    z bazy (także zapisanymi przez inne procesy – bez zależności od ich
+    zegarów), a `compact()` – wywoływane w tle – usuwa wygasłe wiersze.
+    """
+
+    def __init__(self, refresh_seconds: float = 5.0, compact_seconds: float = 3600.0):
+        self.refresh_seconds = refresh_seconds
+        self.compact_seconds = compact_seconds
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._revoked: dict[str, datetime] = {}  # jti → expires_at
+        self._cutoffs: dict[int, datetime] = {}  # user_id → revoked_before
+        self._next_refresh = 0.0
+
+    def clear(self):
+        """Czyści cache w pamięci (np. po zmianie bazy)."""
+        with self._lock:
+            self._reset_state()
+
+    # 🔹 Zapis
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime):
+        """Unieważnia pojedynczy token."""
+        db.merge(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+        db.commit()
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def consume(self, db: Session, jti: str, expires_at: datetime) -> bool:
+        """Jednorazowe użycie tokena (reset hasła) razem z bieżącą transakcją.
+
+        Zwraca False, jeśli token był już zużyty – wtedy transakcja jest wycofywana.
+        """
+        db.add(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        with self._lock:
+            self._revoked[jti] = expires_at
+        return True
+
+    def revoke_all_before(self, db: Session, user_id: int, when: datetime | None = None):
+        """Unieważnia wszystkie tokeny użytkownika wystawione przed `when` (domyślnie teraz)."""
+        when = when or datetime.utcnow()
+        cutoff = db.get(TokenCutoff, user_id)
+        if cutoff is None:
+            db.add(TokenCutoff(user_id=user_id, revoked_before=when))
+        elif cutoff.revoked_before < when:
+            cutoff.revoked_before = when
+            cutoff.updated_at = datetime.utcnow()
+        db.commit()
+        with self._lock:
+            if self._cutoffs.get(user_id, datetime.min) < when:
+                self._cutoffs[user_id] = when
+
+    # 🔹 Odczyt
+
+    def is_revoked(self, db: Session, payload: dict, token: str | None = None) -> bool:
+        """Czy token (zdekodowany `payload`) został unieważniony."""
+        self._maybe_refresh(db)
+
+        jti = token_id(payload, token)
+        if jti is not None and jti in self._revoked:
+            return True
+
+        user_id = payload.get("sub")
+        if user_id is None:
+            return False
+        cutoff = self._cutoffs.get(int(user_id))
+        if cutoff is None:
+            return False
+        issued_at = _from_timestamp(payload.get("iat")) or datetime.min
+        return issued_at < cutoff
+
+    def _maybe_refresh(self, db: Session):
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return
+        with self._lock:
+            if now < self._next_refresh:
+                return
+            self._next_refresh = now + self.refresh_seconds
+        # 🔹 Zapytania poza blokadą – `revoke()` w innych wątkach nie czeka na I/O
+        self.refresh(db)
+
+    def refresh(self, db: Session):
+        """Wczytuje z bazy wszystkie niewygasłe unieważnienia (tabele trzymają tylko takie)."""
+        now = datetime.utcnow()
+        stale_cutoff = now - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        tokens = db.query(RevokedToken.jti, RevokedToken.expires_at).filter(RevokedToken.expires_at >= now).all()
+        cutoffs = db.query(TokenCutoff.user_id, TokenCutoff.revoked_before).filter(
+            TokenCutoff.revoked_before >= stale_cutoff
+        ).all()
+
+        with self._lock:
+            revoked = {jti: exp for jti, exp in self._revoked.items() if exp >= now}
+            revoked.update(tokens)
+            merged = {uid: at for uid, at in self._cutoffs.items() if at >= stale_cutoff}
+            for user_id, revoked_before in cutoffs:
+                if merged.get(user_id, datetime.min) < revoked_before:
+                    merged[user_id] = revoked_before
+            self._revoked, self._cutoffs = revoked, merged
+
+    def compact(self):
+        """Usuwa wygasłe wiersze – we własnej sesji na bazie głównej (zadanie w tle)."""
+        now = datetime.utcnow()
+        # 🔹 Token sprzed granicy i tak już wygasł, więc sama granica jest zbędna
+        stale_cutoff = now - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+        with primary_session() as db:
+            db.query(RevokedToken).filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+            db.query(TokenCutoff).filter(TokenCutoff.revoked_before < stale_cutoff).delete(synchronize_session=False)
+            db.commit()
+
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp >= now}
+            self._cutoffs = {uid: at for uid, at in self._cutoffs.items() if at >= stale_cutoff}
+
+
+revocation_store = RevocationStore()
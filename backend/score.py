@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db, UserScore
-from users import get_current_user
+from database import UserScore
+from users import get_current_user_read, get_user_read_db
 
 router = APIRouter()
 
 @router.get("/score/me")
 def get_my_score(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_user_read_db),
+    current_user = Depends(get_current_user_read)
 ):
     score = db.query(UserScore).filter(UserScore.user_id == current_user.id).first()
     if not score:
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import os
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()  # 🔹 SECRET_KEY może pochodzić z .env – wczytujemy go przed odczytem poniżej
+
+
+# 🔹 Jedna wspólna konfiguracja JWT dla całej aplikacji
+SECRET_KEY = os.getenv("SECRET_KEY", "super_secret_key")  # 🔹 Zmień to na bardziej bezpieczny klucz!
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Tworzy kontekst bcrypt dopiero przy pierwszym użyciu (passlib ładuje się wolno)."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    """Haszuje hasło użytkownika"""
+    return get_pwd_context().hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Sprawdza czy podane hasło pasuje do hasha"""
+    return get_pwd_context().verify(password, hashed_password)
+
+
+def create_access_token(data: dict, expires_delta: timedelta | None = None):
+    """Tworzy token JWT dla użytkownika"""
+    from jose import jwt
+
+    to_encode = data.copy()
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    # 🔹 `jti` pozwala unieważnić pojedynczy token, `iat` – wszystkie sprzed danej chwili.
+    # `iat` jako float z mikrosekundami: porównujemy go dokładnie z granicą unieważnienia.
+    issued_at = now.replace(tzinfo=timezone.utc).timestamp()
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class InvalidTokenError(Exception):
+    """Token JWT jest nieprawidłowy lub wygasł."""
+
+
+def decode_token(token: str) -> dict:
+    """Dekoduje token JWT; przy błędzie rzuca `InvalidTokenError`."""
+    from jose import jwt, JWTError
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as exc:
+        raise InvalidTokenError(str(exc)) from exc
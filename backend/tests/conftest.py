@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    """Świeża baza SQLite (bez Postgresa i bez replik)."""
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+
+    import database
+    from revocation import revocation_store
+
+    database.dispose_engine()
+    revocation_store.clear()
+    yield url
+    database.dispose_engine()
+    revocation_store.clear()
+
+
+@pytest.fixture
+def db(database_url):
+    """Sesja na bazie głównej z utworzonym schematem."""
+    import database
+
+    database.init_db()
+    with database.primary_session() as session:
+        yield session
+
+
+@pytest.fixture
+def client(database_url):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.create_app()) as test_client:
+        yield test_client
+
+
+def make_user(username: str = "owner") -> int:
+    """Tworzy użytkownika bezpośrednio w bazie (bez bcrypt) i zwraca jego ID."""
+    from database import User, primary_session
+
+    with primary_session() as session:
+        user = User(username=username, email=f"{username}@example.com", password="x")
+        session.add(user)
+        session.commit()
+        return user.id
+
+
+def bearer(user_id: int) -> dict:
+    from security import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Nagłówek z tokenem świeżo utworzonego użytkownika."""
+    return bearer(make_user())
@@ -0,0 +1,75 @@
+import gzip
+import json
+
+import pytest
+
+
+FILES = [
+    ("q1.txt", "X100\nIle to 2+2?\n4\n5\n22\n"),
+    ("q2.txt", "X011\nKtóre są parzyste?\n1\n2\n4\n"),
+]
+
+
+def _questions(client, headers, dataset_name):
+    response = client.get(f"/datasets/questions/{dataset_name}", headers=headers)
+    assert response.status_code == 200, response.text
+    return [
+        (q["question_text"], [(a["text"], a["is_correct"]) for a in q["answers"]])
+        for q in response.json()["questions"]
+    ]
+
+
+def test_export_import_clone_round_trip(client, auth_headers):
+    files = [("files", (name, body.encode())) for name, body in FILES]
+    response = client.post("/questions/upload-folder/", data={"dataset_name": "baza"}, files=files, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    original = _questions(client, auth_headers, "baza")
+
+    exported = client.get("/datasets/export/baza", headers=auth_headers)
+    assert exported.status_code == 200
+    header = json.loads(gzip.decompress(exported.content).splitlines()[0])
+    assert header["format"] == "webownik-dataset"
+
+    response = client.post(
+        "/datasets/import/",
+        data={"dataset_name": "kopia"},
+        files={"file": ("baza.jsonl.gz", exported.content)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["count"] == len(FILES)
+    assert _questions(client, auth_headers, "kopia") == original
+
+    response = client.post("/datasets/clone/kopia", data={"new_name": "klon"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert _questions(client, auth_headers, "klon") == original
+
+
+def _gzip_lines(*records):
+    header = {"format": "webownik-dataset", "version": 1, "dataset_name": "zla"}
+    return gzip.compress("".join(json.dumps(r) + "\n" for r in (header, *records)).encode())
+
+
+@pytest.mark.parametrize("payload", [
+    _gzip_lines({"q": "Pytanie", "a": ["A"], "k": 1})[:-10],  # ucięty gzip
+    _gzip_lines({"q": "Pytanie", "a": [None, "B"], "k": 1}),
+    _gzip_lines({"q": "Pytanie", "a": [{"x": 1}], "k": 1}),
+    _gzip_lines({"q": "Pytanie", "a": ["A"], "k": -1}),
+    b"to nie jest gzip",
+])
+def test_import_rejects_malformed_files(client, auth_headers, payload):
+    response = client.post("/datasets/import/", files={"file": ("zla.jsonl.gz", payload)}, headers=auth_headers)
+    assert response.status_code == 400, response.text
+    assert client.get("/datasets/questions/zla", headers=auth_headers).status_code == 404
+
+
+def test_clone_refuses_existing_name(client, auth_headers):
+    files = [("files", (name, body.encode())) for name, body in FILES]
+    for name in ("baza", "inna"):
+        response = client.post("/questions/upload-folder/", data={"dataset_name": name}, files=files, headers=auth_headers)
+        assert response.status_code == 200, response.text
+    before = _questions(client, auth_headers, "inna")
+
+    response = client.post("/datasets/clone/baza", data={"new_name": "inna"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert _questions(client, auth_headers, "inna") == before
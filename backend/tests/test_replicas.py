@@ -0,0 +1,74 @@
+import shutil
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+from conftest import bearer, make_user
+
+FILES = [("files", ("q1.txt", "X10\nIle to 2+2?\n4\n5\n".encode()))]
+
+
+def _replica_client(monkeypatch, *urls, strategy="least_connections"):
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", ",".join(urls))
+    monkeypatch.setenv("DATABASE_REPLICA_STRATEGY", strategy)
+    return TestClient(main.create_app())
+
+
+def _datasets(client, headers):
+    response = client.get("/datasets/datasets/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["datasets"]
+
+
+def test_stale_replica_is_skipped_while_client_sends_last_write(database_url, tmp_path, monkeypatch):
+    replica = tmp_path / "replica.db"
+    with _replica_client(monkeypatch, f"sqlite:///{replica}") as client:
+        headers = bearer(make_user())
+        # 🔹 Replika = migawka sprzed zapisu (użytkownik jest, bazy pytań jeszcze nie)
+        shutil.copy(database_url.removeprefix("sqlite:///"), replica)
+
+        response = client.post("/questions/upload-folder/", data={"dataset_name": "baza"}, files=FILES, headers=headers)
+        assert response.status_code == 200, response.text
+        assert database.LAST_WRITE_COOKIE in client.cookies
+        database.get_replica_router()._pinned.clear()  # 🔹 jak inny proces – zostaje tylko ciasteczko
+
+        assert _datasets(client, headers) == ["baza"]
+        client.cookies.clear()
+        assert _datasets(client, headers) == []
+
+
+def test_replica_without_schema_falls_back_to_primary(database_url, tmp_path, monkeypatch):
+    with _replica_client(monkeypatch, f"sqlite:///{tmp_path / 'empty.db'}") as client:
+        headers = bearer(make_user())
+
+        assert _datasets(client, headers) == []
+        assert database.get_replica_router().candidates() == []
+
+
+def test_unreachable_replica_is_skipped(database_url, tmp_path, monkeypatch):
+    missing = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"
+    replica = tmp_path / "replica.db"
+    with _replica_client(monkeypatch, missing, f"sqlite:///{replica}") as client:
+        headers = bearer(make_user())
+        shutil.copy(database_url.removeprefix("sqlite:///"), replica)
+
+        assert _datasets(client, headers) == []
+        router = database.get_replica_router()
+        assert router._down_until[0] > time.monotonic()
+        assert router.candidates() == [1]
+
+
+@pytest.mark.parametrize("name, value", [
+    ("DATABASE_REPLICA_STRATEGY", "random"),
+    ("READ_YOUR_WRITES_SECONDS", "pięć"),
+])
+def test_invalid_replica_config_fails_at_startup(database_url, tmp_path, monkeypatch, name, value):
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setenv(name, value)
+
+    with pytest.raises(ValueError):
+        with TestClient(main.create_app()):
+            pass
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from conftest import bearer, make_user
+from database import RevokedToken, TokenCutoff
+from revocation import RevocationStore, revocation_store
+from security import create_access_token, decode_token
+
+
+def _payload(user_id: int) -> dict:
+    return decode_token(create_access_token({"sub": str(user_id)}))
+
+
+def test_logout_revokes_only_current_token(client):
+    user_id = make_user()
+    first, second = bearer(user_id), bearer(user_id)
+
+    assert client.post("/users/logout/", headers=first).status_code == 200
+    assert client.get("/users/me/", headers=first).status_code == 401
+    assert client.get("/users/me/", headers=second).status_code == 200
+
+
+def test_token_issued_right_after_cutoff_is_valid(db):
+    store = RevocationStore(refresh_seconds=0)
+    user_id = make_user()
+    old = _payload(user_id)
+
+    store.revoke_all_before(db, user_id)
+    fresh = _payload(user_id)
+
+    assert store.is_revoked(db, old)
+    assert not store.is_revoked(db, fresh)
+
+
+def test_revoke_all_tokens_endpoint_allows_immediate_login(client, monkeypatch):
+    monkeypatch.setattr("users.ADMIN_EMAIL", "admin@example.com")
+    admin = bearer(make_user("admin"))
+    user_id = make_user("student")
+
+    for _ in range(5):
+        old = bearer(user_id)
+        assert client.post(f"/users/{user_id}/revoke-tokens/", headers=admin).status_code == 200
+        assert client.get("/users/me/", headers=old).status_code == 401
+        assert client.get("/users/me/", headers=bearer(user_id)).status_code == 200
+
+
+def test_refresh_sees_rows_stamped_by_a_skewed_clock(db):
+    """Inny proces z zegarem spóźnionym o dobę – wpis i tak trafia do cache."""
+    store = RevocationStore(refresh_seconds=0)
+    user_id = make_user()
+    payload = _payload(user_id)
+    # 🔹 Najpierw zwykłe unieważnienie, żeby cache miał już za sobą jedną synchronizację
+    store.revoke(db, "other", datetime.utcnow() + timedelta(minutes=5))
+    assert not store.is_revoked(db, payload)
+
+    day_ago = datetime.utcnow() - timedelta(days=1)
+    db.add(RevokedToken(jti=payload["jti"], expires_at=datetime.utcnow() + timedelta(minutes=5), revoked_at=day_ago))
+    db.commit()
+
+    assert store.is_revoked(db, payload)
+
+
+def test_consume_is_single_use(db):
+    expires_at = datetime.utcnow() + timedelta(minutes=15)
+    store = RevocationStore()
+
+    assert store.consume(db, "reset-jti", expires_at)
+    assert not store.consume(db, "reset-jti", expires_at)
+
+
+def test_compact_removes_only_expired_rows(db):
+    now = datetime.utcnow()
+    db.add_all([
+        RevokedToken(jti="expired", expires_at=now - timedelta(minutes=1)),
+        RevokedToken(jti="active", expires_at=now + timedelta(minutes=10)),
+        TokenCutoff(user_id=1, revoked_before=now - timedelta(days=1)),
+        TokenCutoff(user_id=2, revoked_before=now),
+    ])
+    db.commit()
+
+    revocation_store.compact()
+
+    assert [jti for (jti,) in db.query(RevokedToken.jti)] == ["active"]
+    assert [uid for (uid,) in db.query(TokenCutoff.user_id)] == [2]
@@ -0,0 +1,38 @@
+from conftest import bearer, make_user
+
+FILES = [("files", ("q1.txt", "X10\nIle to 2+2?\n4\n5\n".encode()))]
+
+
+def _shared_dataset(client):
+    owner = bearer(make_user("owner"))
+    response = client.post("/questions/upload-folder/", data={"dataset_name": "baza"}, files=FILES, headers=owner)
+    assert response.status_code == 200, response.text
+    response = client.post("/datasets/share/baza", headers=owner)
+    assert response.status_code == 200, response.text
+    return owner, response.json()["code"]
+
+
+def test_share_retries_on_code_collision(client, monkeypatch):
+    owner, code = _shared_dataset(client)
+    response = client.post("/questions/upload-folder/", data={"dataset_name": "inna"}, files=FILES, headers=owner)
+    assert response.status_code == 200, response.text
+
+    codes = iter([code, "nowy-kod"])
+    monkeypatch.setattr("get_questions.secrets.token_urlsafe", lambda _: next(codes))
+
+    response = client.post("/datasets/share/inna", headers=owner)
+    assert response.status_code == 200, response.text
+    assert response.json()["code"] == "nowy-kod"
+    assert client.post("/datasets/share/baza", headers=owner).json()["code"] == code
+
+
+def test_concurrent_join_returns_400(client, monkeypatch):
+    _, code = _shared_dataset(client)
+    student = bearer(make_user("student"))
+    assert client.post(f"/datasets/join/{code}", headers=student).status_code == 200
+
+    # 🔹 Jak drugie żądanie, które sprawdziło dostęp przed commitem pierwszego
+    monkeypatch.setattr("get_questions.resolve_dataset_owner", lambda *args: None)
+    response = client.post(f"/datasets/join/{code}", headers=student)
+    assert response.status_code == 400
+    assert "baza" in response.json()["detail"]
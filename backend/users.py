@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from datetime import timedelta, datetime
-from jose import jwt, JWTError
-from database import get_db, User
+from database import get_db, primary_session, read_session, request_last_write, mark_request_write, STREAM_BATCH_SIZE, User, UserScore
+from security import hash_password, verify_password, create_access_token, decode_token, InvalidTokenError
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Request
 from email_utils import send_reset_email
-from database import UsedResetToken
+from revocation import revocation_store, token_id
+import base64
+import csv
+import io
+import json
 import time
 import os
 
@@ -20,26 +25,11 @@ ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
 last_reset_request = {}
 
 
-# 🔹 Klucz JWT
-SECRET_KEY = "super_secret_key"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
 router = APIRouter()
 
-# 🔹 Hashowanie haseł
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # 🔹 Nowa konfiguracja JWT – teraz Swagger pozwala wpisać token ręcznie
 oauth2_scheme = HTTPBearer()
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
-    """Tworzy token JWT dla użytkownika"""
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
 @router.post("/register/")
 def register_user(
     username: str = Form(...),
@@ -57,11 +47,13 @@ def register_user(
         raise HTTPException(status_code=400, detail="Użytkownik z tym adresem e-mail już istnieje.")
 
 
-    hashed_password = pwd_context.hash(password)
+    hashed_password = hash_password(password)
     new_user = User(username=username, email=email, password=hashed_password)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    # 🔹 Nowe konto może jeszcze nie dotrzeć do replik – pierwsze odczyty idą na bazę główną
+    mark_request_write(new_user.id)
 
     return {"message": "Użytkownik zarejestrowany!", "user_id": new_user.id}
 
@@ -73,7 +65,7 @@ def login_user(
 ):
     """✅ Logowanie użytkownika i zwracanie tokena"""
     user = db.query(User).filter(User.email == email).first()
-    if not user or not pwd_context.verify(password, user.password):
+    if not user or not verify_password(password, user.password):
         raise HTTPException(status_code=401, detail="Niepoprawne dane logowania.")
 
     token = create_access_token({
@@ -82,24 +74,44 @@ def login_user(
     "is_admin": user.is_admin
 })
  # 🔹 Teraz zapisujemy ID, a nie username!
+    # 🔹 Konto mogło powstać przed chwilą (np. w innym procesie) – chwilowo czytamy z bazy głównej
+    mark_request_write(user.id)
     return {"access_token": token, "token_type": "bearer"}
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """✅ Pobiera aktualnie zalogowanego użytkownika z JWT"""
+def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """✅ Dekoduje JWT z nagłówka i odrzuca tokeny unieważnione"""
     token = credentials.credentials  # Pobieramy tylko wartość tokena, bez "Bearer"
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Nieprawidłowy token")
+        payload = decode_token(token)
+    except InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Nie można zweryfikować tokena")
 
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        if user is None:
-            raise HTTPException(status_code=401, detail="Nie znaleziono użytkownika")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Nieprawidłowy token")
+    if revocation_store.is_revoked(db, payload, token):
+        raise HTTPException(status_code=401, detail="Token został unieważniony")
+    return payload
 
-        return user  # ✅ Zwracamy OBIEKT `User`, a nie słownik
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Nie można zweryfikować tokena")
+def get_current_user(payload: dict = Depends(get_token_payload), db: Session = Depends(get_db)):
+    """✅ Pobiera aktualnie zalogowanego użytkownika z JWT"""
+    user = db.query(User).filter(User.id == int(payload["sub"])).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Nie znaleziono użytkownika")
+
+    db.info["user_id"] = user.id  # 🔹 po zapisie przypinamy użytkownika do bazy głównej
+    return user  # ✅ Zwracamy OBIEKT `User`, a nie słownik
+
+def get_user_read_db(request: Request, payload: dict = Depends(get_token_payload)):
+    """✅ Sesja do odczytu (replika) dla zalogowanego użytkownika"""
+    yield from read_session(int(payload["sub"]), request_last_write(request))
+
+def get_current_user_read(payload: dict = Depends(get_token_payload), db: Session = Depends(get_user_read_db)):
+    """✅ Jak `get_current_user`, ale użytkownik jest czytany z repliki"""
+    user = db.query(User).filter(User.id == int(payload["sub"])).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Nie znaleziono użytkownika")
+
+    return user
 
 def require_admin(user: User = Depends(get_current_user)):
     if user.email != ADMIN_EMAIL:
@@ -107,24 +119,159 @@ def require_admin(user: User = Depends(get_current_user)):
     return user
 
 
+@router.post("/logout/")
+def logout_user(
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db),
+):
+    """🚪 Wylogowanie – unieważnia bieżący token"""
+    revocation_store.revoke(db, token_id(payload, credentials.credentials), datetime.utcfromtimestamp(payload["exp"]))
+    return {"message": "Wylogowano."}
+
+
 @router.get("/me/")
 def read_users_me(current_user: User = Depends(get_current_user)):
     """✅ Zwraca dane aktualnie zalogowanego użytkownika"""
     return {"user_id": current_user.id, "username": current_user.username}
 
+def _encode_cursor(created_at: datetime, user_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), user_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+
+
+def _prefix_pattern(prefix: str) -> str:
+    """Wzorzec LIKE 'prefiks%' zbudowany po stronie Pythona (stała w zapytaniu może użyć indeksu)."""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _user_filters(
+    username_prefix: str | None,
+    email_prefix: str | None,
+    is_admin: bool | None,
+    created_from: datetime | None,
+    created_to: datetime | None,
+):
+    """Buduje warunki WHERE wspólne dla listy i eksportu użytkowników."""
+    conditions = []
+    if username_prefix:
+        conditions.append(User.username.like(_prefix_pattern(username_prefix), escape="\\"))
+    if email_prefix:
+        conditions.append(User.email.like(_prefix_pattern(email_prefix), escape="\\"))
+    if is_admin is not None:
+        conditions.append(User.is_admin == is_admin)
+    if created_from is not None:
+        conditions.append(User.created_at >= created_from)
+    if created_to is not None:
+        conditions.append(User.created_at < created_to)
+    return conditions
+
+
+def _user_row(user: User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "created_at": user.created_at,
+        "is_admin": user.is_admin,
+    }
+
+
 @router.get("/all/")
-def list_all_users(admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "created_at": user.created_at,
-            "is_admin": user.is_admin,
-        }
-        for user in users
-    ]
+def list_all_users(
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    username_prefix: str | None = None,
+    email_prefix: str | None = None,
+    is_admin: bool | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    with_total: bool = False,
+    admin: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """✅ Stronicowana (keyset po `(created_at, id)`) lista użytkowników z filtrami."""
+    conditions = _user_filters(username_prefix, email_prefix, is_admin, created_from, created_to)
+
+    query = db.query(User).filter(*conditions)
+    if cursor:
+        query = query.filter(tuple_(User.created_at, User.id) > _decode_cursor(cursor))
+
+    # 🔹 Pobieramy o jeden wiersz więcej, żeby wiedzieć, czy jest następna strona
+    users = query.order_by(User.created_at, User.id).limit(limit + 1).all()
+    has_more = len(users) > limit
+    users = users[:limit]
+
+    result = {
+        "items": [_user_row(user) for user in users],
+        "next_cursor": _encode_cursor(users[-1].created_at, users[-1].id) if has_more else None,
+    }
+    if with_total:
+        result["total"] = db.query(func.count(User.id)).filter(*conditions).scalar()
+    return result
+
+
+EXPORT_COLUMNS = ["id", "username", "email", "created_at", "is_admin"]
+SCORE_COLUMNS = ["score", "correct", "incorrect", "time_spent"]
+
+
+@router.get("/export/")
+def export_users(
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    with_scores: bool = False,
+    username_prefix: str | None = None,
+    email_prefix: str | None = None,
+    is_admin: bool | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    admin: User = Depends(require_admin),
+):
+    """📤 Strumieniowy eksport użytkowników do CSV/JSONL (stała pamięć, kursor po stronie serwera)."""
+    conditions = _user_filters(username_prefix, email_prefix, is_admin, created_from, created_to)
+    columns = [getattr(User, name) for name in EXPORT_COLUMNS]
+    header = list(EXPORT_COLUMNS)
+
+    stmt = select(*columns)
+    if with_scores:
+        stmt = select(*columns, *[getattr(UserScore, name) for name in SCORE_COLUMNS]).outerjoin(
+            UserScore, UserScore.user_id == User.id
+        )
+        header += SCORE_COLUMNS
+    stmt = stmt.where(*conditions).order_by(User.created_at, User.id)
+
+    def rows():
+        with primary_session() as db:
+            result = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(header)
+                for row in result:
+                    writer.writerow(row)
+                    if buffer.tell() > 64 * 1024:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
+            else:
+                for row in result:
+                    yield json.dumps(dict(zip(header, row)), default=str) + "\n"
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
 
 @router.delete("/{user_id}/")
 def delete_user_by_id(user_id: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
@@ -134,9 +281,21 @@ def delete_user_by_id(user_id: int, admin: User = Depends(require_admin), db: Se
 
     db.delete(user)
     db.commit()
+    # 🔹 Wymuszamy wylogowanie wszystkich sesji usuniętego konta
+    revocation_store.revoke_all_before(db, user_id)
     return {"message": f"Użytkownik {user.username} został usunięty."}
 
 
+@router.post("/{user_id}/revoke-tokens/")
+def revoke_user_tokens(user_id: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """🔒 Unieważnia wszystkie dotychczas wydane tokeny użytkownika"""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="Użytkownik nie istnieje")
+
+    revocation_store.revoke_all_before(db, user_id)
+    return {"message": "Wszystkie tokeny użytkownika zostały unieważnione."}
+
+
 @router.post("/password-reset-request")
 def password_reset_request(email: str = Form(...), db: Session = Depends(get_db)):
     """🔐 Generuje token do zresetowania hasła i (na razie) zwraca go"""
@@ -177,22 +336,27 @@ def reset_password(
 ):
     """🛠 Ustawia nowe hasło użytkownika na podstawie tokena"""
     try:
-        used = db.query(UsedResetToken).filter(UsedResetToken.token == token).first()
-        if used:
-            raise HTTPException(status_code=400, detail="Token został już użyty.")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=400, detail="Nieprawidłowy lub wygasły token")
 
+    jti = token_id(payload, token)
+    if revocation_store.is_revoked(db, payload, token):
+        raise HTTPException(status_code=400, detail="Token został już użyty.")
+
     user = db.query(User).filter(User.id == int(user_id)).first()
     if not user:
         raise HTTPException(status_code=404, detail="Użytkownik nie istnieje")
 
     # Haszujemy i zapisujemy nowe hasło
-    user.password = pwd_context.hash(new_password)
-    db.add(UsedResetToken(token=token))
-    db.commit()
+    user.password = hash_password(new_password)
+    # 🔹 Zużycie tokena i zmiana hasła w jednej transakcji (unikalny `jti` chroni przed wyścigiem)
+    if not revocation_store.consume(db, jti, datetime.utcfromtimestamp(payload["exp"])):
+        raise HTTPException(status_code=400, detail="Token został już użyty.")
+
+    # 🔹 Po zmianie hasła wylogowujemy wszystkie dotychczasowe sesje
+    revocation_store.revoke_all_before(db, user.id)
 
     return {"message": "Hasło zostało zmienione"}
 